@@ -0,0 +1,53 @@
+"""
+Pitch transposition kernel.
+
+Compiled with Numba when it is installed; otherwise the same arithmetic
+runs as whole-array NumPy operations. Steps are encoded as step numbers
+(C=0 .. B=6) so the kernel never touches strings.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional
+    njit = None
+
+
+def _transpose_arrays(steps, alters, octaves, semitone_shift, sharps, step_semitones, step_lut, alter_lut):
+    """Transpose pitch arrays with NumPy fancy indexing."""
+    # Carry octaves from the unwrapped pitch, so e.g. Cb4 is a semitone below C4
+    shifted = step_semitones[steps] + alters + semitone_shift
+    new_chromatic = shifted % 12
+    return (step_lut[sharps, new_chromatic],
+            alter_lut[sharps, new_chromatic],
+            octaves + shifted // 12)
+
+
+def _transpose_loop(steps, alters, octaves, semitone_shift, sharps, step_semitones, step_lut, alter_lut):
+    """Transpose pitch arrays one element at a time (compiled by Numba)."""
+    n = len(steps)
+    new_steps = np.empty(n, dtype=np.int8)
+    new_alters = np.empty(n, dtype=np.int8)
+    new_octaves = np.empty(n, dtype=np.int16)
+    for i in range(n):
+        shifted = step_semitones[steps[i]] + alters[i] + semitone_shift
+        new_chromatic = shifted % 12
+        new_steps[i] = step_lut[sharps, new_chromatic]
+        new_alters[i] = alter_lut[sharps, new_chromatic]
+        new_octaves[i] = octaves[i] + shifted // 12
+    return new_steps, new_alters, new_octaves
+
+
+if njit is not None:
+    transpose_pitches = njit(cache=True)(_transpose_loop)
+
+    # Compile for the argument types used by transpose.py now, rather than
+    # on the first score
+    transpose_pitches(
+        np.zeros(1, dtype=np.int8), np.zeros(1, dtype=np.int16), np.zeros(1, dtype=np.int16),
+        0, 0,
+        np.zeros(7, dtype=np.int16), np.zeros((2, 12), dtype=np.int8), np.zeros((2, 12), dtype=np.int8)
+    )
+else:
+    transpose_pitches = _transpose_arrays
@@ -10,43 +10,123 @@ Provides REST API endpoints for:
 
 import sys
 import os
+import logging
+import asyncio
+import contextlib
 from pathlib import Path
 import uuid
+import time
+import json
+import hashlib
 import shutil
 from typing import Optional
 import tempfile
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse, JSONResponse
+import aiofiles
+import redis.asyncio as redis
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+
+logger = logging.getLogger(__name__)
 
 # Add parent directory to path to import cli and transpose modules
 sys.path.append(str(Path(__file__).parent.parent))
 
-from cli import run_audiveris, unzip_mxl, parse_musicxml, convert_musicxml_to_pdf
-from transpose import transpose_musicxml, KEY_SIGNATURES
+from cli import run_audiveris, read_mxl_score, parse_musicxml, convert_musicxml_to_pdf, MusicXMLFile
+from transpose import transpose_musicxml, KEY_SIGNATURES, KEY_DISPLAY
+
+
+# The /api/keys response never changes, so build it once
+KEYS_PAYLOAD = {
+    "keys": [
+        {
+            "fifths": fifths,
+            "display": KEY_DISPLAY[fifths + 7],
+            "name": KEY_SIGNATURES[fifths][0]
+        }
+        for fifths in range(-7, 8)
+    ]
+}
 
 app = FastAPI(
     title="Music Transposer API",
     description="API for transposing sheet music from PDF files",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Enable CORS for Flutter web app
+# Chunk sizes for streaming uploads to disk and PDFs to clients
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+DOWNLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Largest PDF accepted for upload
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 50 << 20))  # 50 MiB
+# Room for the multipart boundaries and part headers around the PDF
+UPLOAD_FORM_OVERHEAD = 64 << 10  # 64 KiB
+
+# Every PDF file starts with this header
+PDF_MAGIC = b"%PDF-"
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Reject uploads whose declared Content-Length is over the limit before the
+    form is received and spooled to disk. Uploads without a Content-Length
+    are still capped while upload_pdf streams them.
+    """
+    if request.method == "POST" and request.url.path == "/api/upload-pdf":
+        content_length = request.headers.get("content-length")
+        if content_length is not None and content_length.isdigit() \
+                and int(content_length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+            return ORJSONResponse(
+                status_code=413,
+                content={"detail": f"File exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes"}
+            )
+    return await call_next(request)
+
+
+# Enable CORS for Flutter web app (comma-separated origins, e.g. your Flutter app domain).
+# Added after the upload limit middleware so its 413 responses carry CORS headers too.
+CORS_ORIGINS = [origin.strip() for origin in os.environ.get("CORS_ORIGINS", "").split(",") if origin.strip()]
+if not CORS_ORIGINS:
+    logger.warning("CORS_ORIGINS is not set; allowing requests from any origin (*)")
+    CORS_ORIGINS = ["*"]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your Flutter app domain
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
 # Session storage directory
 SESSIONS_DIR = Path(tempfile.gettempdir()) / "music_transposer_sessions"
 SESSIONS_DIR.mkdir(exist_ok=True)
 
-# Session data storage (in production, use Redis or database)
-sessions = {}
+# Session data storage, shared by all workers
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+SESSION_MAX_AGE = int(os.environ.get("SESSION_MAX_AGE", 3600))  # 1 hour in seconds
+SESSION_SWEEP_INTERVAL = int(os.environ.get("SESSION_SWEEP_INTERVAL", 600))  # 10 minutes in seconds
+
+redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+REDIS_HEALTH_TIMEOUT = 2  # seconds for the /api/health Redis ping
+
+# Uploaded PDFs and their Audiveris results, in working directories
+# keyed by SHA-256 of the PDF (<digest[:2]>/<digest>/)
+OMR_CACHE_DIR = Path(tempfile.gettempdir()) / "music_transposer_omr_cache"
+OMR_CACHE_DIR.mkdir(exist_ok=True)
+OMR_CACHE_MAX_AGE = int(os.environ.get("OMR_CACHE_MAX_AGE", 86400))  # 1 day in seconds
+
+# Audiveris runs: by default every upload gets its own JVM and only the number
+# of concurrent JVMs is capped. With a batch size above 1, uploads already
+# queued share one run, waiting up to the window for more to arrive.
+AUDIVERIS_BATCH_WINDOW = float(os.environ.get("AUDIVERIS_BATCH_WINDOW", 0.5))  # seconds
+AUDIVERIS_BATCH_SIZE = int(os.environ.get("AUDIVERIS_BATCH_SIZE", 1))
+AUDIVERIS_MAX_JVMS = int(os.environ.get("AUDIVERIS_MAX_JVMS", os.cpu_count()))
 
 
 def get_session_dir(session_id: str) -> Path:
@@ -56,6 +136,156 @@ def get_session_dir(session_id: str) -> Path:
     return session_dir
 
 
+class AudiverisBatcher:
+    """
+    Groups PDFs submitted close together into a single Audiveris invocation.
+
+    Audiveris has no server mode, so every run pays the JVM start-up. Batching
+    concurrent uploads amortizes it, and while all JVM slots are busy new
+    uploads queue up and form the next (larger) batch. A batch ties its PDFs
+    together (each result is ready only when the whole run ends), so
+    batch_size=1 runs every PDF on its own and just caps concurrent JVMs.
+    """
+
+    def __init__(self, window: float, batch_size: int, max_jvms: int):
+        self.window = window
+        self.batch_size = batch_size
+        self.jvm_slots = asyncio.Semaphore(max_jvms)
+        self.queue = asyncio.Queue()
+        self.collector = None
+        self.running = set()
+
+    def start(self):
+        """Start collecting submitted PDFs into batches."""
+        self.collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """Stop collecting and cancel the batches still running."""
+        self.collector.cancel()
+        for task in self.running:
+            task.cancel()
+        await asyncio.gather(self.collector, *self.running, return_exceptions=True)
+
+    async def submit(self, pdf_path: str) -> Optional[Path]:
+        """Convert a PDF as part of the next batch and return its exported file."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((pdf_path, future))
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self.queue.get()]
+            # Only wait for stragglers when there is a batch to build
+            if self.batch_size > 1 and not self.queue.empty():
+                await asyncio.sleep(self.window)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            await self.jvm_slots.acquire()
+            task = asyncio.create_task(self._run(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch):
+        try:
+            try:
+                exported = await run_audiveris(
+                    *(pdf_path for pdf_path, _ in batch), work_dir=OMR_CACHE_DIR
+                )
+            except Exception as e:
+                if len(batch) == 1:
+                    _, future = batch[0]
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+                exported = [None] * len(batch)
+
+            for (pdf_path, future), output_file in zip(batch, exported):
+                if output_file is None and len(batch) > 1:
+                    # Another PDF may have brought the batch down; convert this
+                    # one on its own before failing it
+                    try:
+                        output_file, = await run_audiveris(pdf_path, work_dir=OMR_CACHE_DIR)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                if not future.done():
+                    future.set_result(output_file)
+        finally:
+            self.jvm_slots.release()
+
+
+audiveris_batcher = AudiverisBatcher(AUDIVERIS_BATCH_WINDOW, AUDIVERIS_BATCH_SIZE, AUDIVERIS_MAX_JVMS)
+
+
+def session_key(session_id: str) -> str:
+    """Redis key holding a session's data."""
+    return f"sess:{session_id}"
+
+
+async def save_session(session_id: str, data: dict):
+    """Store (or update) session fields and reset the session's expiry."""
+    key = session_key(session_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={field: json.dumps(value) for field, value in data.items()})
+        pipe.expire(key, SESSION_MAX_AGE)
+        await pipe.execute()
+
+
+async def load_session(session_id: str) -> Optional[dict]:
+    """
+    Fetch session data, or None if the session does not exist or expired.
+
+    Every access resets the session's expiry, so active sessions are kept.
+    """
+    key = session_key(session_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hgetall(key)
+        pipe.expire(key, SESSION_MAX_AGE)
+        data, _ = await pipe.execute()
+    if not data:
+        return None
+    return {field: json.loads(value) for field, value in data.items()}
+
+
+def omr_cache_key(digest: str) -> str:
+    """Redis key holding the parsed metadata of a cached OMR result."""
+    return f"omr:{digest}"
+
+
+def get_work_dir(digest: str) -> Path:
+    """Get or create the content-addressed working directory for a PDF."""
+    work_dir = OMR_CACHE_DIR / digest[:2] / digest
+    work_dir.mkdir(parents=True, exist_ok=True)
+    return work_dir
+
+
+def write_file_atomic(path: Path, data: bytes):
+    """Write a file so concurrent readers never see it half-written."""
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+@app.on_event("startup")
+async def start_audiveris_batcher():
+    """Start batching Audiveris conversions."""
+    audiveris_batcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_audiveris_batcher():
+    """Stop batching Audiveris conversions."""
+    await audiveris_batcher.stop()
+
+
+@app.on_event("shutdown")
+async def close_redis():
+    """Close the Redis connection pool."""
+    await redis_client.aclose()
+
+
 @app.get("/")
 async def root():
     """API root - health check."""
@@ -74,8 +304,15 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "ok", "version": "1.0.0"}
+    """Health check endpoint. Reports unavailable (503) if Redis can't be reached."""
+    try:
+        await asyncio.wait_for(redis_client.ping(), timeout=REDIS_HEALTH_TIMEOUT)
+    except (redis.RedisError, OSError, asyncio.TimeoutError) as e:
+        return ORJSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "redis": str(e) or type(e).__name__, "version": "1.0.0"}
+        )
+    return {"status": "ok", "redis": "ok", "version": "1.0.0"}
 
 
 @app.post("/api/upload-pdf")
@@ -94,66 +331,108 @@ async def upload_pdf(file: UploadFile = File(...)):
     # Create session
     session_id = str(uuid.uuid4())
     session_dir = get_session_dir(session_id)
+    upload_path = OMR_CACHE_DIR / f"upload-{session_id}.tmp"
 
     try:
-        # Save uploaded PDF
+        # Stream uploaded PDF to disk in chunks, hashing as we go
+        hasher = hashlib.sha256()
+        total_bytes = 0
+        async with aiofiles.open(upload_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                # Reject non-PDF and oversized uploads before paying for OMR
+                # (a backstop for uploads sent without a Content-Length)
+                if total_bytes == 0 and not chunk.startswith(PDF_MAGIC):
+                    raise HTTPException(status_code=400, detail="File is not a valid PDF")
+                total_bytes += len(chunk)
+                if total_bytes > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes"
+                    )
+
+                hasher.update(chunk)
+                await f.write(chunk)
+
+        if total_bytes == 0:
+            raise HTTPException(status_code=400, detail="File is not a valid PDF")
+        digest = hasher.hexdigest()
+
+        # Each distinct PDF and its Audiveris results live once in a
+        # content-addressed working directory; the session only links to them
+        work_dir = get_work_dir(digest)
         pdf_path = session_dir / "input.pdf"
-        with open(pdf_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Run Audiveris conversion
-        run_audiveris(str(pdf_path))
-
-        # Find generated MXL file
-        mxl_path = pdf_path.with_suffix('.mxl')
-        if not mxl_path.exists():
-            raise HTTPException(
-                status_code=500,
-                detail="Audiveris failed to generate MusicXML file"
-            )
-
-        # Unzip MXL
-        unzipped_dir = unzip_mxl(str(mxl_path))
+        mxl_path = session_dir / "input.mxl"
+        xml_path = session_dir / "input.xml"
+        work_pdf = work_dir / f"{digest}.pdf"
+        work_mxl = work_dir / f"{digest}.mxl"
+        work_xml = work_dir / f"{digest}.xml"
 
-        # Find XML file inside
-        xml_files = list(Path(unzipped_dir).rglob("*.xml"))
-        if not xml_files:
-            raise HTTPException(
-                status_code=500,
-                detail="No MusicXML file found in archive"
-            )
+        os.replace(upload_path, work_pdf)
+        pdf_path.symlink_to(work_pdf)
 
-        xml_path = xml_files[0]
+        # Reuse the Audiveris result if this exact PDF was converted before
+        cached_metadata = await redis_client.get(omr_cache_key(digest))
 
-        # Parse MusicXML
-        music_data = parse_musicxml(str(xml_path))
+        if cached_metadata is not None and work_mxl.exists() and work_xml.exists():
+            await redis_client.expire(omr_cache_key(digest), OMR_CACHE_MAX_AGE)
+            os.utime(work_dir)
+        else:
+            cached_metadata = None
+
+            # Run Audiveris conversion in place (batched with concurrent uploads)
+            await audiveris_batcher.submit(str(work_pdf))
+
+            # Find generated MXL file
+            if not work_mxl.exists():
+                raise HTTPException(
+                    status_code=500,
+                    detail="Audiveris failed to generate MusicXML file"
+                )
+
+            # Read the score XML straight out of the MXL archive and keep a
+            # single copy on disk for transposition
+            _, score_bytes = await asyncio.to_thread(read_mxl_score, str(work_mxl))
+            await asyncio.to_thread(write_file_atomic, work_xml, score_bytes)
+
+        mxl_path.symlink_to(work_mxl)
+        xml_path.symlink_to(work_xml)
+
+        # Parse MusicXML (or reuse the cached metadata)
+        if cached_metadata is not None:
+            metadata = json.loads(cached_metadata)
+            music_data = MusicXMLFile(
+                file_path=str(xml_path),
+                key_signature=metadata["key_signature"],
+                time_signature=tuple(metadata["time_signature"]) if metadata["time_signature"] else None,
+                part_name=metadata["part_name"]
+            )
+        else:
+            # Parse the score bytes already in memory rather than re-reading
+            # them; only the first few elements are read, so a thread is enough
+            music_data = await asyncio.to_thread(parse_musicxml, str(xml_path), data=score_bytes)
+            await redis_client.set(
+                omr_cache_key(digest),
+                json.dumps({
+                    "key_signature": music_data.key_signature,
+                    "time_signature": music_data.time_signature,
+                    "part_name": music_data.part_name
+                }),
+                ex=OMR_CACHE_MAX_AGE
+            )
 
         # Store session data
-        sessions[session_id] = {
+        await save_session(session_id, {
             "pdf_path": str(pdf_path),
             "mxl_path": str(mxl_path),
             "xml_path": str(xml_path),
             "original_key": music_data.key_signature,
             "time_signature": music_data.time_signature,
             "part_name": music_data.part_name
-        }
+        })
 
         # Format key signature for response
-        if music_data.key_signature is not None:
-            key_info = KEY_SIGNATURES[music_data.key_signature]
-            key_name = key_info[0]
-            accidental = key_info[1]
-            count = key_info[2]
-
-            if accidental == 'sharp':
-                key_display = f"{key_name} major ({count} sharps)"
-            elif accidental == 'flat':
-                key_display = f"{key_name} major ({count} flats)"
-            else:
-                key_display = f"{key_name} major"
-        else:
-            key_display = "Unknown"
+        key_display = (KEY_DISPLAY[music_data.key_signature + 7]
+                       if music_data.key_signature in KEY_SIGNATURES else "Unknown")
 
         return {
             "session_id": session_id,
@@ -166,11 +445,15 @@ async def upload_pdf(file: UploadFile = File(...)):
         }
 
     except Exception as e:
-        # Clean up on error
-        if session_id in sessions:
-            del sessions[session_id]
+        # Clean up on error (the files first: Redis may be what failed)
         shutil.rmtree(session_dir, ignore_errors=True)
+        with contextlib.suppress(redis.RedisError):
+            await redis_client.delete(session_key(session_id))
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload_path.unlink(missing_ok=True)
 
 
 @app.post("/api/transpose")
@@ -186,7 +469,8 @@ async def transpose(session_id: str = Form(...), target_key: int = Form(...)):
         transposed_path: Path to transposed MusicXML file
     """
     # Validate session
-    if session_id not in sessions:
+    session_data = await load_session(session_id)
+    if session_data is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
     # Validate target key
@@ -196,36 +480,26 @@ async def transpose(session_id: str = Form(...), target_key: int = Form(...)):
             detail=f"Invalid target key. Must be between -7 and +7, got {target_key}"
         )
 
-    session_data = sessions[session_id]
-
     try:
         # Parse original XML
-        from cli import MusicXMLFile
         music_data = MusicXMLFile(
             file_path=session_data["xml_path"],
             key_signature=session_data["original_key"],
-            time_signature=session_data["time_signature"],
+            time_signature=tuple(session_data["time_signature"]) if session_data["time_signature"] else None,
             part_name=session_data["part_name"]
         )
 
-        # Transpose
-        transposed_path = transpose_musicxml(music_data, target_key)
+        # Transpose in a thread (the instance only lives for this request,
+        # so use the shared parse cache)
+        transposed_path = await asyncio.to_thread(
+            transpose_musicxml, music_data, target_key, keep_source=False
+        )
 
         # Store transposed path in session
-        sessions[session_id]["transposed_path"] = transposed_path
+        await save_session(session_id, {"transposed_path": transposed_path})
 
         # Format target key for response
-        key_info = KEY_SIGNATURES[target_key]
-        key_name = key_info[0]
-        accidental = key_info[1]
-        count = key_info[2]
-
-        if accidental == 'sharp':
-            key_display = f"{key_name} major ({count} sharps)"
-        elif accidental == 'flat':
-            key_display = f"{key_name} major ({count} flats)"
-        else:
-            key_display = f"{key_name} major"
+        key_display = KEY_DISPLAY[target_key + 7]
 
         return {
             "success": True,
@@ -251,11 +525,10 @@ async def convert_to_pdf(session_id: str = Form(...)):
         PDF file download
     """
     # Validate session
-    if session_id not in sessions:
+    session_data = await load_session(session_id)
+    if session_data is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    session_data = sessions[session_id]
-
     # Check if file has been transposed
     if "transposed_path" not in session_data:
         raise HTTPException(
@@ -267,13 +540,22 @@ async def convert_to_pdf(session_id: str = Form(...)):
         transposed_xml = session_data["transposed_path"]
 
         # Convert to PDF
-        pdf_path = convert_musicxml_to_pdf(transposed_xml)
+        pdf_path = await convert_musicxml_to_pdf(transposed_xml)
+
+        async def iter_pdf():
+            async with aiofiles.open(pdf_path, "rb") as f:
+                while chunk := await f.read(DOWNLOAD_CHUNK_SIZE):
+                    yield chunk
 
-        # Return PDF file
-        return FileResponse(
-            pdf_path,
+        # Stream PDF file, deleting the rendered copy once it has been sent
+        return StreamingResponse(
+            iter_pdf(),
             media_type="application/pdf",
-            filename=f"transposed_{Path(pdf_path).name}"
+            headers={
+                "Content-Disposition": f'attachment; filename="transposed_{Path(pdf_path).name}"',
+                "Content-Length": str(os.stat(pdf_path).st_size)
+            },
+            background=BackgroundTask(os.remove, pdf_path)
         )
 
     except Exception as e:
@@ -283,42 +565,61 @@ async def convert_to_pdf(session_id: str = Form(...)):
 @app.get("/api/keys")
 async def get_available_keys():
     """Get list of all available keys for transposition."""
-    keys = []
-    for fifths in range(-7, 8):
-        key_info = KEY_SIGNATURES[fifths]
-        key_name = key_info[0]
-        accidental = key_info[1]
-        count = key_info[2]
-
-        if accidental == 'sharp':
-            display = f"{key_name} major ({count} sharps)"
-        elif accidental == 'flat':
-            display = f"{key_name} major ({count} flats)"
-        else:
-            display = f"{key_name} major"
-
-        keys.append({
-            "fifths": fifths,
-            "display": display,
-            "name": key_name
-        })
-
-    return {"keys": keys}
+    return KEYS_PAYLOAD
 
 
-# Cleanup old sessions (run periodically in production)
-@app.on_event("startup")
-async def cleanup_old_sessions():
-    """Clean up sessions older than 1 hour."""
-    import time
+def sweep_session_dirs(live_session_ids: set):
+    """
+    Remove session directories older than SESSION_MAX_AGE whose session has
+    expired, and OMR working directories older than OMR_CACHE_MAX_AGE.
+    """
     current_time = time.time()
     for session_dir in SESSIONS_DIR.iterdir():
-        if session_dir.is_dir():
-            # Check if older than 1 hour
+        if session_dir.is_dir() and session_dir.name not in live_session_ids:
             dir_age = current_time - session_dir.stat().st_mtime
-            if dir_age > 3600:  # 1 hour in seconds
+            if dir_age > SESSION_MAX_AGE:
                 shutil.rmtree(session_dir, ignore_errors=True)
 
+    for entry in OMR_CACHE_DIR.iterdir():
+        if entry.is_dir() and len(entry.name) == 2:
+            # Shard of content-addressed working directories
+            for work_dir in entry.iterdir():
+                if current_time - work_dir.stat().st_mtime > OMR_CACHE_MAX_AGE:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+        elif current_time - entry.stat().st_mtime > OMR_CACHE_MAX_AGE:
+            # Leftover partial uploads and Audiveris working dirs
+            if entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink(missing_ok=True)
+
+
+async def sweep_sessions_periodically():
+    """Sweep stale session directories every SESSION_SWEEP_INTERVAL seconds."""
+    while True:
+        try:
+            # Sessions still in Redis were used recently; keep their files
+            live_session_ids = {
+                key.split(":", 1)[1] async for key in redis_client.scan_iter(match="sess:*")
+            }
+            await asyncio.to_thread(sweep_session_dirs, live_session_ids)
+        except Exception:
+            logger.exception("Session cleanup failed")
+
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    """Start cleaning up old sessions in the background."""
+    app.state.session_sweeper = asyncio.create_task(sweep_sessions_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_session_sweeper():
+    """Stop the background session cleanup."""
+    app.state.session_sweeper.cancel()
+
 
 if __name__ == "__main__":
     import uvicorn
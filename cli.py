@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
+import asyncio
+import io
 import os
-import subprocess
-import sys
 from pathlib import Path
 import shutil
 import tempfile
 
 from dataclasses import dataclass
-from typing import Tuple, Dict, Optional
-import xml.etree.ElementTree as ET
+from typing import Any, Tuple, Dict, Optional
+from lxml import etree as ET
 
 
 
@@ -47,52 +47,110 @@ elif SYSTEM == "Windows":
 else:
     raise RuntimeError(f"Unsupported operating system: {SYSTEM}")
 
-def run_audiveris(input_file):
-    """Run Audiveris CLI to convert a scanned score into MusicXML (MXL)."""
-    input_path = Path(input_file).expanduser().resolve()
+# Audiveris export formats, in order of preference
+AUDIVERIS_OUTPUT_SUFFIXES = (".mxl", ".musicxml", ".xml")
 
-    if not input_path.exists():
-        print(f"❌ File not found: {input_path}")
-        sys.exit(1)
-
-    # Create a temporary working directory for output
-    temp_dir = Path(tempfile.mkdtemp(prefix="audiveris_convert_"))
-    print(f"🔧 Working in: {temp_dir}")
-
-    # Run Audiveris CLI in batch mode
-    cmd = [
-        AUDIVERIS_BIN,
-        "-batch",
-        "-export",
-        "-output", str(temp_dir),
-        str(input_path)
-    ]
+async def _communicate(proc):
+    """
+    Wait for a subprocess and collect its output. If the waiting task is
+    cancelled, the subprocess is killed instead of being left running.
+    """
+    try:
+        return await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
 
-    print(f"🚀 Running: {' '.join(cmd)}")
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
 
-    if result.returncode != 0:
-        print("❌ Audiveris failed.")
-        print(result.stderr or result.stdout)
-        sys.exit(result.returncode)
+async def run_audiveris(*input_files, work_dir=None):
+    """
+    Run Audiveris CLI to convert scanned scores into MusicXML (MXL).
 
-    # Find resulting MXL or MusicXML
-    outputs = list(temp_dir.rglob("*.mxl")) + list(temp_dir.rglob("*.musicxml")) + list(temp_dir.rglob("*.xml"))
-    if not outputs:
-        print("❌ No MusicXML/MXL file was generated.")
-        sys.exit(2)
+    All inputs are converted by a single Audiveris invocation, so a batch
+    pays the JVM start-up only once. Each result is moved next to its input;
+    pass a work_dir on the inputs' filesystem to make that a plain rename.
 
-    # Copy first found output to same directory as input
-    output_file = outputs[0]
-    target_file = input_path.with_suffix(output_file.suffix)
-    shutil.copy2(output_file, target_file)
-    print(f"✅ Exported: {target_file}")
+    Returns:
+        List with the exported file for each input (None if Audiveris
+        produced nothing for it), in input order
+    """
+    input_paths = [Path(input_file).expanduser().resolve() for input_file in input_files]
 
-    # Clean up temp folder
-    shutil.rmtree(temp_dir)
+    for input_path in input_paths:
+        if not input_path.exists():
+            raise FileNotFoundError(f"File not found: {input_path}")
 
+    # Create a temporary working directory for output
+    temp_dir = Path(tempfile.mkdtemp(prefix="audiveris_convert_", dir=work_dir))
+    print(f"🔧 Working in: {temp_dir}")
 
-def convert_musicxml_to_pdf(musicxml_file, output_pdf=None):
+    try:
+        # Give every input a unique index prefix so outputs of a batch
+        # can't collide and can be matched back to their input
+        inputs_dir = temp_dir / "inputs"
+        inputs_dir.mkdir()
+        aliases = []
+        for index, input_path in enumerate(input_paths):
+            alias = inputs_dir / f"{index}-{input_path.name}"
+            try:
+                alias.symlink_to(input_path)
+            except OSError:
+                shutil.copy2(input_path, alias)
+            aliases.append(alias)
+
+        output_dir = temp_dir / "output"
+
+        # Run Audiveris CLI in batch mode
+        cmd = [
+            AUDIVERIS_BIN,
+            "-batch",
+            "-export",
+            "-output", str(output_dir),
+            *(str(alias) for alias in aliases)
+        ]
+
+        print(f"🚀 Running: {' '.join(cmd)}")
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await _communicate(proc)
+
+        # Find resulting MXL or MusicXML files in a single walk of the output tree
+        outputs = {}
+        for p in output_dir.rglob("*"):
+            if p.suffix in AUDIVERIS_OUTPUT_SUFFIXES:
+                outputs.setdefault(p.name.split("-", 1)[0], []).append(p)
+
+        if proc.returncode != 0 and not outputs:
+            output = (stderr or stdout).decode(errors="replace")
+            raise RuntimeError(f"Audiveris failed: {output}")
+
+        exported = []
+        for index, input_path in enumerate(input_paths):
+            candidates = outputs.get(str(index))
+            if not candidates:
+                print(f"❌ No MusicXML/MXL file was generated for {input_path.name}")
+                exported.append(None)
+                continue
+
+            # Move the preferred output (MXL first) to same directory as input
+            output_file = min(candidates, key=lambda p: AUDIVERIS_OUTPUT_SUFFIXES.index(p.suffix))
+            target_file = input_path.with_suffix(output_file.suffix)
+            shutil.move(output_file, target_file)
+            print(f"✅ Exported: {target_file}")
+            exported.append(target_file)
+
+        return exported
+    finally:
+        # Clean up temp folder
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+async def convert_musicxml_to_pdf(musicxml_file, output_pdf=None):
     """
     Convert a MusicXML file to PDF using MuseScore.
 
@@ -130,10 +188,16 @@ def convert_musicxml_to_pdf(musicxml_file, output_pdf=None):
     ]
 
     print(f"🎼 Converting {input_path.name} to PDF...")
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await _communicate(proc)
 
-    if result.returncode != 0:
-        raise RuntimeError(f"MuseScore conversion failed: {result.stderr or result.stdout}")
+    if proc.returncode != 0:
+        output = (stderr or stdout).decode(errors="replace")
+        raise RuntimeError(f"MuseScore conversion failed: {output}")
 
     if not output_path.exists():
         raise RuntimeError("PDF file was not generated")
@@ -169,57 +233,96 @@ def unzip_mxl(mxl_path):
     return out_dir
 
 
-from dataclasses import dataclass
+# Compiled once: rootfile paths in an MXL container.xml, with or without namespace
+_XP_ROOTFILE_PATHS = ET.XPath("//*[local-name()='rootfile']/@full-path")
+
+
+def read_mxl_score(mxl_path):
+    """
+    Reads the main score out of a .mxl (compressed MusicXML) file without
+    extracting the archive. Returns (score path inside the archive, bytes).
+    """
+    mxl = Path(mxl_path).expanduser().resolve()
+    if not mxl.exists():
+        raise FileNotFoundError(f"File not found: {mxl}")
+
+    try:
+        with zipfile.ZipFile(mxl, 'r') as zf:
+            # The container lists the score as its first rootfile
+            container = ET.fromstring(zf.read("META-INF/container.xml"))
+            score_names = _XP_ROOTFILE_PATHS(container)
+            if not score_names:
+                raise RuntimeError("No MusicXML file found in archive")
+
+            score_name = str(score_names[0])
+            return score_name, zf.read(score_name)
+    except zipfile.BadZipFile:
+        raise RuntimeError("The .mxl file is not a valid ZIP archive")
+    except KeyError:
+        raise RuntimeError("No MusicXML file found in archive")
 
 
-@dataclass
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True, frozen=True)
 class MusicXMLFile:
     file_path: str
     key_signature: Optional[int]
     time_signature: Optional[Tuple[int, int]]
     part_name: Optional[str]
+    # Scanned score kept by transpose.py so repeated transpositions skip the XML walk
+    source_score: Optional[Any] = field(default=None, compare=False, repr=False)
 
 
     
-def parse_musicxml(file_path: str) -> MusicXMLFile:
-    """Extract key metadata and structural information from a MusicXML file."""
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-    
-    # Namespace handling (MusicXML files may include one)
-    ns = {"": root.tag.split("}")[0].strip("{")} if "}" in root.tag else {}
-
-    def find_text(tag, parent=root):
-        elem = parent.find(tag, ns)
-        return elem.text.strip() if elem is not None and elem.text else None
- 
-    # Key and time signature (first measure)
-    key_elem = root.find(".//key/fifths", ns)
-    key_signature = int(key_elem.text) if key_elem is not None else None
-    
-    beats = root.find(".//time/beats", ns)
-    beat_type = root.find(".//time/beat-type", ns)
-    time_signature = (int(beats.text), int(beat_type.text)) if beats is not None and beat_type is not None else None
-    
-    # Part name
-    part_name = find_text(".//part-name")
-    
- 
-    
+def parse_musicxml(file_path: str, data: Optional[bytes] = None) -> MusicXMLFile:
+    """
+    Extract key metadata and structural information from a MusicXML file.
+
+    If data is given, it is parsed instead of reading file_path from disk.
+    """
+    source = io.BytesIO(data) if data is not None else file_path
+    key_signature = None
+    beats = None
+    beat_type = None
+    part_name = None
+
+    # Stream the document and stop as soon as the first key, time signature
+    # and part name have been seen, instead of building the whole tree
+    for _, elem in ET.iterparse(source, events=("end",), huge_tree=False):
+        # Strip the namespace (MusicXML files may include one)
+        localname = ET.QName(elem).localname
+
+        if localname == "fifths" and key_signature is None:
+            key_signature = int(elem.text)
+        elif localname == "beats" and beats is None:
+            beats = int(elem.text)
+        elif localname == "beat-type" and beat_type is None:
+            beat_type = int(elem.text)
+        elif localname == "part-name" and part_name is None:
+            part_name = elem.text.strip() if elem.text else ""
+
+        elem.clear()
+
+        if None not in (key_signature, beats, beat_type, part_name):
+            break
+
+    time_signature = (beats, beat_type) if beats is not None and beat_type is not None else None
 
-    
     return MusicXMLFile(
         file_path=file_path,
         key_signature=key_signature,
         time_signature=time_signature,
-        part_name=part_name,
+        part_name=part_name or None,
     )
-    
+
+
 from typing import Tuple, Dict, List, Optional
-import xml.etree.ElementTree as ET
 
 
-#run_audiveris("/Users/harikoornala/Code/Random Projects with Chat/omr app apptmet 2/sheet1.pdf")
-#unzip_mxl("/Users/harikoornala/Code/Random Projects with Chat/omr app apptmet 2/sheet1.mxl")
-xml_data = parse_musicxml("/Users/harikoornala/Code/Random Projects with Chat/omr app apptmet 2/sheet1_unzipped/sheet1.xml")
-print(xml_data)
+if __name__ == "__main__":
+    #run_audiveris("/Users/harikoornala/Code/Random Projects with Chat/omr app apptmet 2/sheet1.pdf")
+    #unzip_mxl("/Users/harikoornala/Code/Random Projects with Chat/omr app apptmet 2/sheet1.mxl")
+    xml_data = parse_musicxml("/Users/harikoornala/Code/Random Projects with Chat/omr app apptmet 2/sheet1_unzipped/sheet1.xml")
+    print(xml_data)
@@ -9,11 +9,18 @@ and transposing to different keys.
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
-import threading
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import subprocess
+import sys
+import threading
 
 from cli import run_audiveris, unzip_mxl, parse_musicxml, convert_musicxml_to_pdf
-from transpose import transpose_musicxml, KEY_SIGNATURES
+from transpose import transpose_musicxml, KEY_DISPLAY, KEY_DISPLAY_TO_FIFTHS
+
+# Command that opens a file with its default application (Windows uses os.startfile)
+_OPEN_CMD = {"darwin": ["open"], "win32": None}.get(sys.platform, ["xdg-open"])
 
 
 class MusicTransposerApp:
@@ -30,9 +37,55 @@ class MusicTransposerApp:
         self.music_data = None
         self.transposed_xml_path = None  # Track the last transposed file
 
+        # Background workers for OMR, transposition and PDF conversion
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="omr")
+        self.closing = False
+        self.running_tasks = set()  # (event loop, task) of cli coroutines in progress
+        self.tasks_lock = threading.Lock()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+
         # Setup UI
         self.setup_ui()
 
+    def _on_close(self):
+        """Stop background work (killing Audiveris/MuseScore) and close the window."""
+        with self.tasks_lock:
+            self.closing = True
+            running = list(self.running_tasks)
+        for loop, task in running:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # Finished and closed in the meantime
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
+    def _run_async(self, coro):
+        """Run a cli coroutine on the current worker thread, cancellable by _on_close."""
+        loop = asyncio.new_event_loop()
+        try:
+            task = loop.create_task(coro)
+            with self.tasks_lock:
+                if self.closing:
+                    task.cancel()
+                self.running_tasks.add((loop, task))
+            try:
+                return loop.run_until_complete(task)
+            finally:
+                with self.tasks_lock:
+                    self.running_tasks.discard((loop, task))
+        finally:
+            loop.close()
+
+    def _call_in_ui(self, callback):
+        """Schedule callback on the Tk thread, unless the window is closing."""
+        if self.closing:
+            return
+        try:
+            self.root.after(0, callback)
+        except (RuntimeError, tk.TclError):
+            pass  # Window destroyed in the meantime
+
     def setup_ui(self):
         """Create the user interface."""
         # Header
@@ -159,11 +212,10 @@ class MusicTransposerApp:
 
         # Create dropdown with all keys
         self.key_var = tk.StringVar()
-        self.key_options = self.create_key_options()
         self.key_dropdown = ttk.Combobox(
             transpose_frame,
             textvariable=self.key_var,
-            values=self.key_options,
+            values=KEY_DISPLAY,
             state="readonly",
             width=25,
             font=("Arial", 10)
@@ -215,29 +267,6 @@ class MusicTransposerApp:
         )
         self.result_label.pack()
 
-    def create_key_options(self):
-        """Create formatted list of key options for dropdown."""
-        options = []
-        self.key_mapping = {}  # Map display string to fifths value
-
-        for fifths in range(-7, 8):
-            key_info = KEY_SIGNATURES[fifths]
-            key_name = key_info[0]
-            accidental = key_info[1]
-            count = key_info[2]
-
-            if accidental == 'sharp':
-                display = f"{key_name} major ({count} sharps)"
-            elif accidental == 'flat':
-                display = f"{key_name} major ({count} flats)"
-            else:
-                display = f"{key_name} major"
-
-            options.append(display)
-            self.key_mapping[display] = fifths
-
-        return options
-
     def upload_pdf(self):
         """Handle PDF file upload."""
         file_path = filedialog.askopenfilename(
@@ -253,16 +282,14 @@ class MusicTransposerApp:
             self.upload_btn.config(state=tk.DISABLED)
 
             # Process in background thread
-            thread = threading.Thread(target=self.process_pdf)
-            thread.daemon = True
-            thread.start()
+            self.executor.submit(self.process_pdf)
 
     def process_pdf(self):
         """Process PDF through Audiveris, unzip, and parse."""
         try:
             # Step 1: Run Audiveris
             self.update_status("⏳ Converting PDF to MusicXML with Audiveris...")
-            run_audiveris(self.pdf_path)
+            self._run_async(run_audiveris(self.pdf_path))
 
             # Find the generated MXL file
             pdf_path = Path(self.pdf_path)
@@ -276,40 +303,30 @@ class MusicTransposerApp:
             unzipped_dir = unzip_mxl(self.mxl_path)
 
             # Find the XML file inside
-            xml_files = list(Path(unzipped_dir).rglob("*.xml"))
-            if not xml_files:
+            xml_path = next(Path(unzipped_dir).rglob("*.xml"), None)
+            if xml_path is None:
                 raise FileNotFoundError("No XML file found in MXL archive")
 
-            self.xml_path = str(xml_files[0])
+            self.xml_path = str(xml_path)
 
             # Step 3: Parse MusicXML
             self.update_status("⏳ Parsing MusicXML data...")
             self.music_data = parse_musicxml(self.xml_path)
 
             # Update UI with results
-            self.root.after(0, self.display_music_info)
+            self._call_in_ui(self.display_music_info)
 
         except Exception as e:
-            self.root.after(0, lambda: self.show_error(str(e)))
+            self._call_in_ui(lambda: self.show_error(str(e)))
 
     def update_status(self, message):
         """Update status label (thread-safe)."""
-        self.root.after(0, lambda: self.status_label.config(text=message))
+        self._call_in_ui(lambda: self.status_label.config(text=message))
 
     def display_music_info(self):
         """Display parsed music information in UI."""
         if self.music_data.key_signature is not None:
-            key_info = KEY_SIGNATURES[self.music_data.key_signature]
-            key_name = key_info[0]
-            accidental = key_info[1]
-            count = key_info[2]
-
-            if accidental == 'sharp':
-                key_display = f"{key_name} major ({count} sharps)"
-            elif accidental == 'flat':
-                key_display = f"{key_name} major ({count} flats)"
-            else:
-                key_display = f"{key_name} major"
+            key_display = KEY_DISPLAY[self.music_data.key_signature + 7]
 
             self.current_key_label.config(
                 text=f"Current Key: {key_display}",
@@ -345,7 +362,7 @@ class MusicTransposerApp:
             return
 
         # Find the fifths value for selected key
-        target_fifths = self.key_mapping.get(selected)
+        target_fifths = KEY_DISPLAY_TO_FIFTHS.get(selected)
 
         if target_fifths is None:
             messagebox.showerror("Error", "Invalid key selection")
@@ -364,13 +381,11 @@ class MusicTransposerApp:
         def do_transpose():
             try:
                 output_path = transpose_musicxml(self.music_data, target_fifths)
-                self.root.after(0, lambda: self.show_transpose_success(output_path))
+                self._call_in_ui(lambda: self.show_transpose_success(output_path))
             except Exception as e:
-                self.root.after(0, lambda: self.show_error(f"Transposition failed: {e}"))
+                self._call_in_ui(lambda: self.show_error(f"Transposition failed: {e}"))
 
-        thread = threading.Thread(target=do_transpose)
-        thread.daemon = True
-        thread.start()
+        self.executor.submit(do_transpose)
 
     def show_transpose_success(self, output_path):
         """Display success message after transposition."""
@@ -401,14 +416,12 @@ class MusicTransposerApp:
         # Convert in background
         def do_convert():
             try:
-                pdf_path = convert_musicxml_to_pdf(self.transposed_xml_path)
-                self.root.after(0, lambda: self.show_pdf_success(pdf_path))
+                pdf_path = self._run_async(convert_musicxml_to_pdf(self.transposed_xml_path))
+                self._call_in_ui(lambda: self.show_pdf_success(pdf_path))
             except Exception as e:
-                self.root.after(0, lambda: self.show_error(f"PDF conversion failed: {e}"))
+                self._call_in_ui(lambda: self.show_error(f"PDF conversion failed: {e}"))
 
-        thread = threading.Thread(target=do_convert)
-        thread.daemon = True
-        thread.start()
+        self.executor.submit(do_convert)
 
     def show_pdf_success(self, pdf_path):
         """Display success message after PDF conversion."""
@@ -426,9 +439,15 @@ class MusicTransposerApp:
         )
 
         if response:
-            # Open PDF with default application
-            import subprocess
-            subprocess.run(["open", pdf_path])  # macOS command
+            # Open PDF with default application, without waiting for it
+            try:
+                if _OPEN_CMD is None:
+                    os.startfile(pdf_path)
+                else:
+                    subprocess.Popen(_OPEN_CMD + [pdf_path],
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not open PDF: {e}")
 
     def show_error(self, error_message):
         """Display error message."""
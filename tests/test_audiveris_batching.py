@@ -0,0 +1,154 @@
+"""
+Checks that batched Audiveris runs hand each PDF its own result: outputs
+are matched back to inputs by index prefix, and a PDF whose batch failed
+is converted again on its own before it is failed.
+"""
+
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+# Import the top-level modules from the repository root
+REPO_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import cli
+
+# api/main.py shares its module name with the GUI's main.py, so load it by path
+_spec = importlib.util.spec_from_file_location("api_main", REPO_ROOT / "api" / "main.py")
+api_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(api_main)
+
+
+# Stand-in for the Audiveris CLI: exports each input's contents as
+# output/<input stem>/<input stem>.mxl, and exports nothing (exiting 1)
+# for inputs that start with "BAD"
+FAKE_AUDIVERIS = """\
+import sys
+from pathlib import Path
+
+args = sys.argv[1:]
+output_dir = Path(args[args.index("-output") + 1])
+failed = False
+for arg in args[args.index("-output") + 2:]:
+    data = Path(arg).read_bytes()
+    if data.startswith(b"BAD"):
+        failed = True
+        continue
+    book_dir = output_dir / Path(arg).stem
+    book_dir.mkdir(parents=True, exist_ok=True)
+    (book_dir / (Path(arg).stem + ".mxl")).write_bytes(data)
+sys.exit(1 if failed else 0)
+"""
+
+
+@pytest.fixture
+def fake_audiveris(tmp_path, monkeypatch):
+    script = tmp_path / "audiveris"
+    script.write_text(f"#!{sys.executable}\n{FAKE_AUDIVERIS}")
+    script.chmod(0o755)
+    monkeypatch.setattr(cli, "AUDIVERIS_BIN", str(script))
+
+
+def make_pdf(path: Path, data: bytes) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_batch_outputs_match_inputs(tmp_path, fake_audiveris):
+    # Same file name in different directories, so only the index prefix tells them apart
+    first = make_pdf(tmp_path / "a" / "score.pdf", b"first")
+    second = make_pdf(tmp_path / "b" / "score.pdf", b"second")
+
+    exported = asyncio.run(cli.run_audiveris(first, second, work_dir=tmp_path))
+
+    assert exported == [tmp_path / "a" / "score.mxl", tmp_path / "b" / "score.mxl"]
+    assert [path.read_bytes() for path in exported] == [b"first", b"second"]
+
+
+def test_batch_reports_missing_output_per_input(tmp_path, fake_audiveris):
+    good = make_pdf(tmp_path / "good.pdf", b"good")
+    bad = make_pdf(tmp_path / "bad.pdf", b"BAD")
+
+    exported = asyncio.run(cli.run_audiveris(bad, good, work_dir=tmp_path))
+
+    assert exported == [None, tmp_path / "good.mxl"]
+
+
+def test_failed_batch_raises(tmp_path, fake_audiveris):
+    bad = make_pdf(tmp_path / "bad.pdf", b"BAD")
+
+    with pytest.raises(RuntimeError, match="Audiveris failed"):
+        asyncio.run(cli.run_audiveris(bad, work_dir=tmp_path))
+
+
+class RecordingAudiveris:
+    """run_audiveris replacement recording each invocation's inputs."""
+
+    def __init__(self, fail_batches: bool):
+        self.fail_batches = fail_batches
+        self.calls = []
+
+    async def __call__(self, *input_files, work_dir=None):
+        self.calls.append(input_files)
+        if len(input_files) > 1 and self.fail_batches:
+            raise RuntimeError("Audiveris failed: batch")
+        exported = []
+        for input_file in input_files:
+            if "bad" in input_file:
+                if len(input_files) == 1:
+                    raise RuntimeError(f"Audiveris failed: {input_file}")
+                exported.append(None)
+            else:
+                exported.append(Path(input_file).with_suffix(".mxl"))
+        return exported
+
+
+async def submit_all(batcher, pdf_paths):
+    batcher.start()
+    try:
+        # Every PDF is queued before the collector wakes up, so they form one batch
+        return await asyncio.gather(
+            *(batcher.submit(pdf_path) for pdf_path in pdf_paths), return_exceptions=True
+        )
+    finally:
+        await batcher.stop()
+
+
+@pytest.mark.parametrize("fail_batches", [False, True], ids=["missing-output", "batch-error"])
+def test_batcher_reruns_failed_pdfs_alone(monkeypatch, fail_batches):
+    audiveris = RecordingAudiveris(fail_batches)
+    monkeypatch.setattr(api_main, "run_audiveris", audiveris)
+
+    async def run():
+        batcher = api_main.AudiverisBatcher(window=0, batch_size=3, max_jvms=1)
+        return await submit_all(batcher, ["one.pdf", "bad.pdf", "two.pdf"])
+
+    one, bad, two = asyncio.run(run())
+
+    assert audiveris.calls[0] == ("one.pdf", "bad.pdf", "two.pdf")
+    assert one == Path("one.mxl")
+    assert two == Path("two.mxl")
+    assert isinstance(bad, RuntimeError)
+    # Only the PDFs left without a result are converted again, one at a time
+    retried = [("one.pdf",), ("bad.pdf",), ("two.pdf",)] if fail_batches else [("bad.pdf",)]
+    assert audiveris.calls[1:] == retried
+
+
+def test_batcher_runs_lone_pdf_without_retry(monkeypatch):
+    audiveris = RecordingAudiveris(fail_batches=False)
+    monkeypatch.setattr(api_main, "run_audiveris", audiveris)
+
+    async def run():
+        batcher = api_main.AudiverisBatcher(window=0, batch_size=1, max_jvms=1)
+        return await submit_all(batcher, ["bad.pdf", "one.pdf"])
+
+    bad, one = asyncio.run(run())
+
+    assert isinstance(bad, RuntimeError)
+    assert one == Path("one.mxl")
+    assert audiveris.calls == [("bad.pdf",), ("one.pdf",)]
@@ -0,0 +1,116 @@
+"""
+Checks every pitch transposition kernel against the original per-note
+arithmetic (note_to_chromatic / chromatic_to_note before vectorization),
+with the octave carried from the unwrapped pitch.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Import the top-level modules from the repository root
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import _transpose_kernel
+import transpose
+
+
+STEPS = "CDEFGAB"
+ALTERS = range(-2, 3)
+OCTAVE = 4
+
+
+def reference_note_to_chromatic(step, alter):
+    base = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+    return (base[step] + alter) % 12
+
+
+def reference_chromatic_to_note(chromatic_index, prefer_sharps):
+    chromatic_index = chromatic_index % 12
+    naturals = {0: 'C', 2: 'D', 4: 'E', 5: 'F', 7: 'G', 9: 'A', 11: 'B'}
+    if chromatic_index in naturals:
+        return (naturals[chromatic_index], 0)
+    if prefer_sharps:
+        return {1: ('C', 1), 3: ('D', 1), 6: ('F', 1), 8: ('G', 1), 10: ('A', 1)}[chromatic_index]
+    return {1: ('D', -1), 3: ('E', -1), 6: ('G', -1), 8: ('A', -1), 10: ('B', -1)}[chromatic_index]
+
+
+def reference_transpose(step, alter, octave, semitone_shift, prefer_sharps):
+    chromatic_value = reference_note_to_chromatic(step, alter)
+    new_step, new_alter = reference_chromatic_to_note(chromatic_value + semitone_shift, prefer_sharps)
+    # The original arithmetic carried from the wrapped chromatic value, which put
+    # e.g. Cb4 + 1 semitone in octave 5; carry from the written pitch instead
+    unwrapped = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}[step] + alter
+    return new_step, new_alter, octave + (unwrapped + semitone_shift) // 12
+
+
+def kernel_inputs():
+    """Every step with every alteration -2..2, as the arrays transpose.py passes."""
+    pitches = [(step, alter) for step in STEPS for alter in ALTERS]
+    steps = np.array([STEPS.index(step) for step, _ in pitches], dtype=np.int8)
+    alters = np.array([alter for _, alter in pitches], dtype=np.int16)
+    octaves = np.full(len(pitches), OCTAVE, dtype=np.int16)
+    return pitches, steps, alters, octaves
+
+
+def kernel_args(semitone_shift, prefer_sharps):
+    return (semitone_shift, int(prefer_sharps),
+            transpose._STEP_SEMITONES, transpose._STEP_LUT, transpose._ALTER_LUT)
+
+
+KERNELS = {
+    "numpy": _transpose_kernel._transpose_arrays,
+    # The loop body as plain Python, so its arithmetic is checked without Numba
+    "loop": _transpose_kernel._transpose_loop,
+}
+
+
+def numba_kernel(*args):
+    pytest.importorskip("numba")
+    return _transpose_kernel.transpose_pitches(*args)
+
+
+@pytest.mark.parametrize("kernel", [*KERNELS.values(), numba_kernel], ids=[*KERNELS, "numba"])
+@pytest.mark.parametrize("prefer_sharps", [False, True])
+@pytest.mark.parametrize("semitone_shift", range(12))
+def test_kernel_matches_reference(kernel, semitone_shift, prefer_sharps):
+    pitches, steps, alters, octaves = kernel_inputs()
+
+    new_steps, new_alters, new_octaves = kernel(steps, alters, octaves, *kernel_args(semitone_shift, prefer_sharps))
+
+    result = [
+        (STEPS[new_step], new_alter, new_octave)
+        for new_step, new_alter, new_octave in zip(new_steps.tolist(), new_alters.tolist(), new_octaves.tolist())
+    ]
+    expected = [
+        reference_transpose(step, alter, OCTAVE, semitone_shift, prefer_sharps)
+        for step, alter in pitches
+    ]
+    assert result == expected
+
+
+@pytest.mark.parametrize("step, alter, semitone_shift, expected", [
+    # Cb4 sounds as B3, so it only reaches C4 a semitone up
+    ('C', -1, 1, ('C', 0, OCTAVE)),
+    ('C', -1, 0, ('B', 0, OCTAVE - 1)),
+    # B#4 sounds as C5
+    ('B', 1, 0, ('C', 0, OCTAVE + 1)),
+    ('B', 1, 11, ('B', 0, OCTAVE + 1)),
+    ('B', 0, 1, ('C', 0, OCTAVE + 1)),
+    # Double alterations across the octave boundary
+    ('C', -2, 2, ('C', 0, OCTAVE)),
+    ('B', 2, 10, ('B', 0, OCTAVE + 1)),
+])
+def test_octave_crossing(step, alter, semitone_shift, expected):
+    steps = np.array([STEPS.index(step)], dtype=np.int8)
+    alters = np.array([alter], dtype=np.int16)
+    octaves = np.array([OCTAVE], dtype=np.int16)
+
+    new_steps, new_alters, new_octaves = transpose._transpose_pitches(
+        steps, alters, octaves, semitone_shift, prefer_sharps=True
+    )
+
+    assert (STEPS[new_steps[0]], int(new_alters[0]), int(new_octaves[0])) == expected
+    assert expected == reference_transpose(step, alter, OCTAVE, semitone_shift, True)
@@ -0,0 +1,241 @@
+"""
+Runs small MusicXML scores through transpose_musicxml and checks that a
+MusicXMLFile transposed to several keys in turn (reusing its cached,
+already rewritten tree) writes the same files as fresh single-key runs,
+and that malformed sources are only transposed when no notes were lost.
+"""
+
+import contextlib
+import io
+import os
+import re
+import sys
+from pathlib import Path
+
+import pytest
+from lxml import etree as ET
+
+# Import the top-level modules from the repository root
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cli import MusicXMLFile, parse_musicxml
+from transpose import transpose_musicxml, transpose_musicxml_many
+
+
+# Two parts in C major: naturals, sharps and flats, a key change, and a rest
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise{xmlns}>
+  <part-list>
+    <score-part id="P1"><part-name>Flute</part-name></score-part>
+    <score-part id="P2"><part-name>Cello</part-name></score-part>
+  </part-list>
+  <part id="P1">
+    <measure number="1">
+      <attributes>
+        <divisions>1</divisions>
+        <key><fifths>0</fifths></key>
+        <time><beats>4</beats><beat-type>4</beat-type></time>
+      </attributes>
+      <note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>
+      <note><pitch><step>F</step><alter>1</alter><octave>4</octave></pitch><duration>1</duration></note>
+      <note><pitch><step>B</step><alter>-1</alter><octave>4</octave></pitch><duration>1</duration></note>
+      <note><rest/><duration>1</duration></note>
+    </measure>
+    <measure number="2">
+      <attributes><key><fifths>0</fifths></key></attributes>
+      <note><pitch><step>E</step><octave>5</octave></pitch><duration>2</duration></note>
+      <note><pitch><step>A</step><octave>4</octave></pitch><duration>2</duration></note>
+    </measure>
+  </part>
+  <part id="P2">
+    <measure number="1">
+      <attributes>
+        <divisions>1</divisions>
+        <key><fifths>0</fifths></key>
+        <time><beats>4</beats><beat-type>4</beat-type></time>
+      </attributes>
+      <note><pitch><step>G</step><octave>2</octave></pitch><duration>2</duration></note>
+      <note><pitch><step>E</step><alter>-1</alter><octave>3</octave></pitch><duration>2</duration></note>
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+NAMESPACES = {
+    "plain": "",
+    "namespaced": ' xmlns="http://www.musicxml.org/ns/musicxml"',
+}
+
+# Bb, D and Eb major, back to the source key, then Bb again
+TARGET_KEYS = [-2, 2, -3, 0, -2]
+
+
+def write_score(path: Path, xmlns: str, score: str = SCORE) -> Path:
+    path.write_text(score.format(xmlns=xmlns), encoding="utf-8")
+    return path
+
+
+def prefixed(score: str) -> str:
+    """The score with every element in a prefixed (mx:) MusicXML namespace."""
+    score = re.sub(r"<(/?)(?=[a-z])", r"<\1mx:", score)
+    return score.replace("<mx:score-partwise{xmlns}>",
+                         '<mx:score-partwise xmlns:mx="http://www.musicxml.org/ns/musicxml">')
+
+
+def quietly(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def fresh_transposition(source: Path, target_key: int, output_path: Path) -> bytes:
+    """Transpose a newly parsed MusicXMLFile once, with nothing cached."""
+    music_file = parse_musicxml(str(source))
+    quietly(transpose_musicxml, music_file, target_key, str(output_path), keep_source=False)
+    return output_path.read_bytes()
+
+
+def pitches(data: bytes):
+    """(child element names, step, alter, octave) of every <pitch>, in order."""
+    result = []
+    for pitch in ET.fromstring(data).iter("{*}pitch"):
+        children = {ET.QName(child).localname: child.text for child in pitch}
+        result.append((
+            tuple(ET.QName(child).localname for child in pitch),
+            children["step"], children.get("alter"), children["octave"]
+        ))
+    return result
+
+
+def fifths(data: bytes):
+    return [elem.text for elem in ET.fromstring(data).iter("{*}fifths")]
+
+
+@pytest.fixture(params=[*NAMESPACES, "prefixed"])
+def source(request, tmp_path):
+    if request.param == "prefixed":
+        return write_score(tmp_path / "score.xml", "", prefixed(SCORE))
+    return write_score(tmp_path / "score.xml", NAMESPACES[request.param])
+
+
+def test_transposes_pitches_and_keys(source, tmp_path):
+    # C major to Eb major is 3 semitones up, spelled with flats
+    data = fresh_transposition(source, -3, tmp_path / "eb.xml")
+
+    assert fifths(data) == ["-3", "-3", "-3"]
+    assert pitches(data) == [
+        (("step", "alter", "octave"), "E", "-1", "4"),
+        (("step", "octave"), "A", None, "4"),
+        (("step", "alter", "octave"), "D", "-1", "5"),
+        (("step", "octave"), "G", None, "5"),
+        (("step", "octave"), "C", None, "5"),
+        (("step", "alter", "octave"), "B", "-1", "2"),
+        (("step", "alter", "octave"), "G", "-1", "3"),
+    ]
+
+
+def test_repeated_transpositions_match_fresh_runs(source, tmp_path):
+    music_file = parse_musicxml(str(source))
+
+    for index, target_key in enumerate(TARGET_KEYS):
+        output_path = tmp_path / f"repeated_{index}.xml"
+        quietly(transpose_musicxml, music_file, target_key, str(output_path))
+
+        expected = fresh_transposition(source, target_key, tmp_path / f"fresh_{index}.xml")
+        assert output_path.read_bytes() == expected, f"transposition {index} to {target_key}"
+
+    assert music_file.source_score is not None
+
+
+def test_alter_is_added_and_removed_across_writes(source, tmp_path):
+    music_file = parse_musicxml(str(source))
+
+    # C4 and F#4 go to D4 and G#4 in D major, then to Bb4 and E5 in Bb major:
+    # the <alter> moves from the second note to the first
+    d_major = quietly(transpose_musicxml, music_file, 2, str(tmp_path / "d.xml"))
+    bb_major = quietly(transpose_musicxml, music_file, -2, str(tmp_path / "bb.xml"))
+
+    first_d, second_d = pitches(Path(d_major).read_bytes())[:2]
+    first_bb, second_bb = pitches(Path(bb_major).read_bytes())[:2]
+    assert first_d == (("step", "octave"), "D", None, "4")
+    assert second_d == (("step", "alter", "octave"), "G", "1", "4")
+    assert first_bb == (("step", "alter", "octave"), "B", "-1", "4")
+    assert second_bb == (("step", "octave"), "E", None, "5")
+
+
+@pytest.mark.parametrize("keep_source", [True, False])
+def test_many_matches_fresh_runs(source, tmp_path, keep_source):
+    music_file = parse_musicxml(str(source))
+
+    output_paths = quietly(transpose_musicxml_many, music_file, TARGET_KEYS, keep_source=keep_source)
+
+    assert len(output_paths) == len(TARGET_KEYS)
+    for index, (target_key, output_path) in enumerate(zip(TARGET_KEYS, output_paths)):
+        expected = fresh_transposition(source, target_key, tmp_path / f"fresh_{index}.xml")
+        assert Path(output_path).read_bytes() == expected, f"transposition {index} to {target_key}"
+
+
+def test_same_key_copies_source(source, tmp_path):
+    music_file = parse_musicxml(str(source))
+
+    output_path = quietly(transpose_musicxml, music_file, 0, str(tmp_path / "c.xml"))
+
+    assert Path(output_path).read_bytes() == source.read_bytes()
+    assert music_file.source_score is None
+
+
+def test_rewritten_source_invalidates_cached_score(tmp_path):
+    source = write_score(tmp_path / "score.xml", "")
+    music_file = parse_musicxml(str(source))
+    quietly(transpose_musicxml, music_file, 2, str(tmp_path / "before.xml"))
+    cached = music_file.source_score
+
+    # Same key and part, different first note; make sure the mtime moves on
+    write_score(source, "", SCORE.replace("<step>C</step><octave>4</octave>", "<step>D</step><octave>4</octave>"))
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    after = quietly(transpose_musicxml, music_file, 2, str(tmp_path / "after.xml"))
+
+    assert music_file.source_score is not cached
+    assert pitches(Path(after).read_bytes())[0] == (("step", "octave"), "E", None, "4")
+    assert Path(after).read_bytes() == fresh_transposition(source, 2, tmp_path / "fresh.xml")
+
+
+# Malformed sources: best-effort parsing must not hide lost notes. The
+# MusicXMLFile is built directly, as the API does from its session, since
+# parse_musicxml's metadata scan does not recover from errors.
+F_SHARP = "<pitch><step>F</step><alter>1</alter><octave>4</octave></pitch>"
+MALFORMED = {
+    "truncated": SCORE[:SCORE.index('<part id="P2">') + 40],
+    "broken-pitch": SCORE.replace(F_SHARP, F_SHARP.replace("<octave>", "<octave")),
+}
+
+
+@pytest.mark.parametrize("keep_source", [True, False])
+@pytest.mark.parametrize("case", MALFORMED)
+def test_lossy_recovery_is_rejected(tmp_path, case, keep_source):
+    source = write_score(tmp_path / "score.xml", "", MALFORMED[case])
+    music_file = MusicXMLFile(str(source), key_signature=0, time_signature=(4, 4), part_name="Flute")
+
+    with pytest.raises(ValueError, match="truncated|malformed"):
+        quietly(transpose_musicxml, music_file, 2, str(tmp_path / "out.xml"), keep_source=keep_source)
+
+    assert not (tmp_path / "out.xml").exists()
+
+
+@pytest.mark.parametrize("keep_source", [True, False])
+def test_recoverable_source_still_transposes(tmp_path, capsys, keep_source):
+    clean = write_score(tmp_path / "clean.xml", "")
+    expected = pitches(fresh_transposition(clean, 2, tmp_path / "clean_d.xml"))
+
+    # An unescaped & loses nothing but the character itself
+    source = write_score(tmp_path / "score.xml", "", SCORE.replace(
+        "<part-list>", "<work><work-title>Salt & Pepper</work-title></work><part-list>"
+    ))
+    music_file = MusicXMLFile(str(source), key_signature=0, time_signature=(4, 4), part_name="Flute")
+    capsys.readouterr()
+
+    output_path = transpose_musicxml(music_file, 2, str(tmp_path / "out.xml"), keep_source=keep_source)
+
+    assert "Recovered from 1 XML error(s)" in capsys.readouterr().out
+    assert pitches(Path(output_path).read_bytes()) == expected
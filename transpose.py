@@ -6,19 +6,24 @@ Transposes a MusicXML file to a different key signature by modifying
 all pitch elements and updating the key signature throughout the score.
 """
 
-import xml.etree.ElementTree as ET
+import copy
+import os
+import re
+import shutil
+import threading
+import numpy as np
+from lxml import etree as ET
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 from dataclasses import dataclass
 
+from _transpose_kernel import transpose_pitches
+from cli import MusicXMLFile, parse_musicxml
 
-@dataclass
-class MusicXMLFile:
-    file_path: str
-    key_signature: Optional[int]
-    time_signature: Optional[Tuple[int, int]]
-    part_name: Optional[str]
 
+# Namespace used by namespaced MusicXML documents
+MUSICXML_NS = "http://www.musicxml.org/ns/musicxml"
 
 # Chromatic scale mapping
 NOTES = ['C', 'D', 'E', 'F', 'G', 'A', 'B']
@@ -44,10 +49,41 @@ KEY_SIGNATURES = {
 }
 
 
+def format_key_display(fifths: int) -> str:
+    """Format a key signature for display, e.g. "E major (3 flats)"."""
+    key_name, accidental, count = KEY_SIGNATURES[fifths]
+    if accidental == 'sharp':
+        return f"{key_name} major ({count} sharps)"
+    elif accidental == 'flat':
+        return f"{key_name} major ({count} flats)"
+    return f"{key_name} major"
+
+
+# Display string of every key, indexed by fifths + 7, and the reverse mapping
+KEY_DISPLAY = tuple(format_key_display(f) for f in range(-7, 8))
+KEY_DISPLAY_TO_FIFTHS = {display: fifths for fifths, display in enumerate(KEY_DISPLAY, start=-7)}
+
+
+# Index of each natural step, and its semitone offset from C
+_STEP_IDX = {'C': 0, 'D': 1, 'E': 2, 'F': 3, 'G': 4, 'A': 5, 'B': 6}
+_BASE = (0, 2, 4, 5, 7, 9, 11)
+
+# Step and alteration for each chromatic index (0-11), indexed by
+# [int(prefer_sharps)][chromatic]: row 0 spells black keys with flats, row 1 with sharps.
+# The NumPy tables below are built from these and use the same row order.
+_STEP_FROM_CHROM = (
+    ('C', 'D', 'D', 'E', 'E', 'F', 'G', 'G', 'A', 'A', 'B', 'B'),
+    ('C', 'C', 'D', 'D', 'E', 'F', 'F', 'G', 'G', 'A', 'A', 'B'),
+)
+_ALTER_FROM_CHROM = (
+    (0, -1, 0, -1, 0, 0, -1, 0, -1, 0, -1, 0),
+    (0, 1, 0, 1, 0, 0, 1, 0, 1, 0, 1, 0),
+)
+
+
 def note_to_chromatic(step: str, alter: int = 0) -> int:
     """Convert a note step and alteration to chromatic index (0-11)."""
-    base_notes = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
-    return (base_notes[step] + alter) % 12
+    return (_BASE[_STEP_IDX[step]] + alter) % 12
 
 
 def chromatic_to_note(chromatic_index: int, prefer_sharps: bool = True) -> Tuple[str, int]:
@@ -61,37 +97,326 @@ def chromatic_to_note(chromatic_index: int, prefer_sharps: bool = True) -> Tuple
     Returns:
         Tuple of (step, alter) where alter is -1 (flat), 0 (natural), or 1 (sharp)
     """
-    # Natural notes mapping
-    naturals = {0: 'C', 2: 'D', 4: 'E', 5: 'F', 7: 'G', 9: 'A', 11: 'B'}
-
     chromatic_index = chromatic_index % 12
+    spelling = 1 if prefer_sharps else 0
+    return (_STEP_FROM_CHROM[spelling][chromatic_index], _ALTER_FROM_CHROM[spelling][chromatic_index])
+
+
+# Semitone offset of each step number (C=0 .. B=6)
+_STEP_SEMITONES = np.array(_BASE, dtype=np.int16)
+
+# Step letters (ASCII) to step numbers and back; -1 marks anything that isn't a step
+_ASCII_TO_STEP = np.full(256, -1, dtype=np.int8)
+for _letter, _idx in _STEP_IDX.items():
+    _ASCII_TO_STEP[ord(_letter)] = _idx
+_STEP_LETTERS = np.frombuffer(b"CDEFGAB", dtype=np.uint8)
 
-    if chromatic_index in naturals:
-        return (naturals[chromatic_index], 0)
+# Step number and alteration of each chromatic index, indexed by
+# [int(prefer_sharps), chromatic] like _STEP_FROM_CHROM/_ALTER_FROM_CHROM
+_STEP_LUT = np.array([[_STEP_IDX[step] for step in row] for row in _STEP_FROM_CHROM], dtype=np.int8)
+_ALTER_LUT = np.array(_ALTER_FROM_CHROM, dtype=np.int8)
 
-    # Black keys - choose sharp or flat
-    if prefer_sharps:
-        # Use the note below and sharp it
-        sharp_map = {1: ('C', 1), 3: ('D', 1), 6: ('F', 1), 8: ('G', 1), 10: ('A', 1)}
-        return sharp_map[chromatic_index]
-    else:
-        # Use the note above and flat it
-        flat_map = {1: ('D', -1), 3: ('E', -1), 6: ('G', -1), 8: ('A', -1), 10: ('B', -1)}
-        return flat_map[chromatic_index]
+
+def _transpose_pitches(steps: np.ndarray, alters: np.ndarray, octaves: np.ndarray,
+                       semitone_shift: int, prefer_sharps: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Transpose arrays of pitches by a number of semitones.
+
+    Args:
+        steps: Step numbers (C=0 .. B=6)
+        alters: Alterations in semitones
+        octaves: Octave numbers
+        semitone_shift: Semitones to transpose up by (0-11)
+        prefer_sharps: If True, spell black keys with sharps; otherwise flats
+
+    Returns:
+        Tuple of (new step numbers, new alterations, new octaves)
+    """
+    return transpose_pitches(steps, alters, octaves, semitone_shift, int(prefer_sharps),
+                             _STEP_SEMITONES, _STEP_LUT, _ALTER_LUT)
+
+
+# Chromatic index of each key's tonic, indexed by fifths + 7
+_KEY_TO_SEMITONE = tuple(
+    note_to_chromatic(KEY_SIGNATURES[f][0],
+                      1 if KEY_SIGNATURES[f][1] == 'sharp' else
+                      -1 if KEY_SIGNATURES[f][1] == 'flat' else 0)
+    for f in range(-7, 8)
+)
 
 
 def calculate_semitone_shift(from_key: int, to_key: int) -> int:
     """Calculate the semitone shift between two key signatures."""
-    from_tonic = note_to_chromatic(KEY_SIGNATURES[from_key][0],
-                                   1 if KEY_SIGNATURES[from_key][1] == 'sharp' else
-                                   -1 if KEY_SIGNATURES[from_key][1] == 'flat' else 0)
-    to_tonic = note_to_chromatic(KEY_SIGNATURES[to_key][0],
-                                 1 if KEY_SIGNATURES[to_key][1] == 'sharp' else
-                                 -1 if KEY_SIGNATURES[to_key][1] == 'flat' else 0)
-    return (to_tonic - from_tonic) % 12
+    return (_KEY_TO_SEMITONE[to_key + 7] - _KEY_TO_SEMITONE[from_key + 7]) % 12
+
+
+# Parser for MusicXML sources. Large orchestral scores can exceed libxml2's
+# default limits, and OMR output is sometimes slightly malformed, so parse
+# best-effort. MusicXML needs no xml:id table, entity expansion, comments or
+# processing instructions.
+_PARSER = ET.XMLParser(
+    recover=True,
+    collect_ids=False,
+    resolve_entities=False,
+    huge_tree=True,
+    remove_comments=True,
+    remove_pis=True
+)
+
 
+# Guards _PARSER so each parse reads back its own error log
+_PARSER_LOCK = threading.Lock()
 
-def transpose_musicxml(music_file: MusicXMLFile, target_key: int, output_path: Optional[str] = None) -> str:
+# <pitch> start tags in raw MusicXML, and complete pitches in a parsed tree
+_RAW_PITCH_TAG = re.compile(rb"<(?:[\w.-]+:)?pitch\s*>")
+_XP_COMPLETE_PITCHES = ET.XPath(
+    "count(//*[local-name()='pitch'][*[local-name()='step'] and *[local-name()='octave']])"
+)
+
+
+def _check_recovered(file_path: str, tree: ET._ElementTree, errors: list):
+    """
+    Accept a tree that was recovered from malformed XML only if no music was
+    lost: the document must still end with its root element, and every
+    <pitch> in the file must have come through with its step and octave.
+    """
+    root = tree.getroot()
+    data = Path(file_path).read_bytes()
+    first_error = f"{errors[0].message.strip()} (line {errors[0].line})"
+
+    root_name = f"{root.prefix}:{ET.QName(root).localname}" if root.prefix else ET.QName(root).localname
+    if not data.rstrip().endswith(f"</{root_name}>".encode()):
+        raise ValueError(f"MusicXML file is truncated or has trailing content: {first_error}")
+
+    expected = len(_RAW_PITCH_TAG.findall(data))
+    recovered = int(_XP_COMPLETE_PITCHES(tree))
+    if recovered < expected:
+        raise ValueError(
+            f"MusicXML file is malformed; only {recovered} of {expected} notes could be read: {first_error}"
+        )
+
+    print(f"⚠️ Recovered from {len(errors)} XML error(s) in {file_path}, first: {first_error}")
+
+
+def _parse_file(file_path: str) -> ET._ElementTree:
+    """Parse a MusicXML file, rejecting recovered trees that lost notes."""
+    with _PARSER_LOCK:
+        tree = ET.parse(file_path, _PARSER)
+        errors = [e for e in _PARSER.error_log if e.level >= ET.ErrorLevels.ERROR]
+
+    if errors:
+        _check_recovered(file_path, tree, errors)
+    return tree
+
+
+@lru_cache(maxsize=16)
+def _parse_source(file_path: str, mtime_ns: int) -> ET._ElementTree:
+    """Parse a MusicXML file once per (path, modification time)."""
+    return _parse_file(file_path)
+
+
+def load_source_tree(file_path: str) -> ET._ElementTree:
+    """
+    Return a private copy of a parsed MusicXML file.
+
+    The file is parsed only once while it is unchanged on disk, so repeated
+    transpositions of the same source (e.g. trying several keys) skip the parse.
+    """
+    tree = _parse_source(file_path, os.stat(file_path).st_mtime_ns)
+    return copy.deepcopy(tree)
+
+
+@lru_cache(maxsize=None)
+def _key_and_pitch_xpath(ns_uri: Optional[str]) -> ET.XPath:
+    """
+    Compiled XPath selecting key <fifths> and <pitch> elements in document
+    order, for scores in the given namespace (or none).
+    """
+    if ns_uri:
+        return ET.XPath("//mx:key/mx:fifths | //mx:pitch", namespaces={"mx": ns_uri})
+    return ET.XPath("//key/fifths | //pitch")
+
+
+# Compile the expressions for plain and namespaced MusicXML up front
+_key_and_pitch_xpath(None)
+_key_and_pitch_xpath(MUSICXML_NS)
+
+
+@dataclass
+class _SourceScore:
+    """A parsed source score with its key signatures and pitches gathered."""
+    mtime_ns: int           # Modification time of the source when it was loaded
+    tree: ET._ElementTree
+    alter_tag: str
+    fifths: list            # <fifths> elements of every key signature
+    pitches: list           # [pitch, step, alter, octave] elements; alter is None for naturals
+    steps: np.ndarray       # Original step numbers (C=0 .. B=6)
+    alters: np.ndarray      # Original alterations
+    octaves: np.ndarray     # Original octaves
+
+
+def _load_source_score(file_path: str, shared_parse: bool) -> _SourceScore:
+    """
+    Parse a MusicXML file and collect its key signatures and pitches in a single pass.
+
+    With shared_parse, the tree is a copy from the module's parse cache;
+    otherwise the file is parsed into a tree owned by the returned score.
+    """
+    mtime_ns = os.stat(file_path).st_mtime_ns
+
+    tree = load_source_tree(file_path) if shared_parse else _parse_file(file_path)
+    root = tree.getroot()
+
+    # Detect namespace (default or prefixed, e.g. <mx:score-partwise xmlns:mx=...>)
+    ns_uri = ET.QName(root).namespace
+    ns_prefix = "{" + ns_uri + "}" if ns_uri else ""
+
+    fifths_tag = f"{ns_prefix}fifths"
+    step_tag = f"{ns_prefix}step"
+    alter_tag = f"{ns_prefix}alter"
+    octave_tag = f"{ns_prefix}octave"
+
+    fifths = []
+    pitches = []
+    for elem in _key_and_pitch_xpath(ns_uri)(root):
+        if elem.tag == fifths_tag:
+            fifths.append(elem)
+            continue
+
+        # MusicXML fixes the child order as step, [alter], octave
+        children = list(elem)
+        if len(children) == 2:
+            step, octave = children
+            alter = None
+        elif len(children) == 3:
+            step, alter, octave = children
+        else:
+            step = elem.find(step_tag)
+            alter = elem.find(alter_tag)
+            octave = elem.find(octave_tag)
+        if step is not None and octave is not None:
+            pitches.append([elem, step, alter, octave])
+
+    # Gather current pitch info into arrays
+    letters = np.frombuffer("".join(step.text for _, step, _, _ in pitches).encode("ascii"), dtype=np.uint8)
+    steps = _ASCII_TO_STEP[letters]
+    if len(steps) != len(pitches) or (steps < 0).any():
+        raise ValueError("Pitch steps must be single letters A-G")
+    alters = np.array(
+        [int(alter.text) if alter is not None and alter.text else 0 for _, _, alter, _ in pitches],
+        dtype=np.int16
+    )
+    octaves = np.array([int(octave.text) for _, _, _, octave in pitches], dtype=np.int16)
+
+    return _SourceScore(mtime_ns, tree, alter_tag, fifths, pitches, steps, alters, octaves)
+
+
+def _get_source_score(music_file: MusicXMLFile, keep_source: bool) -> _SourceScore:
+    """
+    Return the scanned score for music_file.
+
+    With keep_source, the score is cached on music_file (loaded on first use
+    or when the file has changed on disk since) and owns the only parsed copy
+    of the file. Otherwise it is built from the module's parse cache and not
+    kept, which suits instances that live for a single transposition.
+    """
+    if not keep_source:
+        return _load_source_score(music_file.file_path, shared_parse=True)
+
+    score = music_file.source_score
+    if score is None or score.mtime_ns != os.stat(music_file.file_path).st_mtime_ns:
+        score = _load_source_score(music_file.file_path, shared_parse=False)
+        # MusicXMLFile is frozen; the cache field is left out of comparison and hashing
+        object.__setattr__(music_file, "source_score", score)
+    return score
+
+
+def _default_output_path(file_path: str, target_key: int) -> str:
+    """Output path for a transposition: {original}_transposed_to_{key}.xml next to the source."""
+    # Spell out the accidental so e.g. B and Bb major don't share a file
+    key_name, accidental, _ = KEY_SIGNATURES[target_key]
+    if accidental:
+        key_name += f"_{accidental}"
+    original_path = Path(file_path)
+    return str(original_path.with_name(original_path.stem + f"_transposed_to_{key_name}.xml"))
+
+
+def _copy_source(music_file: MusicXMLFile, target_key: int, output_path: Optional[str] = None) -> str:
+    """Write an unchanged copy of a score that is already in target_key."""
+    if output_path is None:
+        output_path = _default_output_path(music_file.file_path, target_key)
+
+    shutil.copyfile(music_file.file_path, output_path)
+
+    print(f"✅ Already in {KEY_SIGNATURES[target_key][0]}, copied to: {output_path}")
+
+    return output_path
+
+
+def _write_transposed(score: _SourceScore, music_file: MusicXMLFile, target_key: int,
+                      output_path: Optional[str] = None) -> str:
+    """
+    Rewrite a loaded score in target_key and write it to output_path.
+
+    New pitches are always computed from the original ones, so the same
+    score can be written out in several keys in turn.
+    """
+    # Calculate transposition interval
+    semitone_shift = calculate_semitone_shift(music_file.key_signature, target_key)
+    prefer_sharps = target_key >= 0  # Positive keys use sharps, negative use flats
+
+    print(f"🎵 Transposing from {KEY_SIGNATURES[music_file.key_signature][0]} " +
+          f"to {KEY_SIGNATURES[target_key][0]} ({semitone_shift} semitones)")
+
+    # Update all key signatures
+    for fifths in score.fifths:
+        fifths.text = str(target_key)
+
+    # Transpose all pitches at once
+    new_steps, new_alters, new_octaves = _transpose_pitches(
+        score.steps, score.alters, score.octaves, semitone_shift, prefer_sharps
+    )
+
+    # Update XML
+    for pitch, new_step, new_alter, new_octave in zip(
+        score.pitches, _STEP_LETTERS[new_steps].tobytes().decode("ascii"), new_alters.tolist(), new_octaves.tolist()
+    ):
+        pitch_elem, step, alter, octave = pitch
+        step.text = new_step
+        octave.text = str(new_octave)
+
+        if new_alter == 0:
+            # Remove alter element if natural
+            if alter is not None:
+                pitch_elem.remove(alter)
+                pitch[2] = None
+        else:
+            # Add or update alter element
+            if alter is None:
+                # Insert after step
+                alter = ET.Element(score.alter_tag)
+                pitch_elem.insert(1, alter)
+                pitch[2] = alter
+            alter.text = str(new_alter)
+
+    notes_transposed = len(score.pitches)
+
+    # Determine output path
+    if output_path is None:
+        output_path = _default_output_path(music_file.file_path, target_key)
+
+    # Write transposed file through a 1 MiB buffer
+    with open(output_path, "wb", buffering=1 << 20) as f:
+        score.tree.write(f, encoding="UTF-8", xml_declaration=True, standalone=False, pretty_print=False)
+
+    print(f"✅ Transposed {notes_transposed} notes")
+    print(f"✅ Output written to: {output_path}")
+
+    return output_path
+
+
+def transpose_musicxml(music_file: MusicXMLFile, target_key: int, output_path: Optional[str] = None,
+                       keep_source: bool = True) -> str:
     """
     Transpose a MusicXML file to a different key signature.
 
@@ -99,6 +424,8 @@ def transpose_musicxml(music_file: MusicXMLFile, target_key: int, output_path: O
         music_file: MusicXMLFile dataclass with source file info
         target_key: Target key signature in fifths notation (-7 to +7)
         output_path: Optional output file path. If None, creates {original}_transposed.xml
+        keep_source: Keep the parsed source on music_file for later transpositions.
+            Pass False for throwaway instances to use the shared parse cache instead.
 
     Returns:
         Path to the transposed output file
@@ -109,91 +436,55 @@ def transpose_musicxml(music_file: MusicXMLFile, target_key: int, output_path: O
     if target_key not in KEY_SIGNATURES:
         raise ValueError(f"Target key must be between -7 and +7, got {target_key}")
 
-    # Calculate transposition interval
-    semitone_shift = calculate_semitone_shift(music_file.key_signature, target_key)
-    prefer_sharps = target_key >= 0  # Positive keys use sharps, negative use flats
+    # Nothing to rewrite if the score is already in the target key
+    if target_key == music_file.key_signature:
+        return _copy_source(music_file, target_key, output_path)
 
-    print(f"🎵 Transposing from {KEY_SIGNATURES[music_file.key_signature][0]} " +
-          f"to {KEY_SIGNATURES[target_key][0]} ({semitone_shift} semitones)")
+    score = _get_source_score(music_file, keep_source)
+    return _write_transposed(score, music_file, target_key, output_path)
 
-    # Parse the XML file
-    tree = ET.parse(music_file.file_path)
-    root = tree.getroot()
 
-    # Detect namespace
-    ns = {"": root.tag.split("}")[0].strip("{")} if "}" in root.tag else {}
-    ns_prefix = "{" + ns[""] + "}" if ns else ""
+def transpose_musicxml_many(music_file: MusicXMLFile, target_keys: List[int],
+                            keep_source: bool = True) -> List[str]:
+    """
+    Transpose a MusicXML file to several key signatures.
+
+    The source is parsed and scanned once; each target key is then written
+    from the same in-memory tree.
 
-    # Update all key signatures
-    for key_elem in root.findall(f".//{ns_prefix}key", ns):
-        fifths = key_elem.find(f"{ns_prefix}fifths", ns)
-        if fifths is not None:
-            fifths.text = str(target_key)
-
-    # Transpose all pitches
-    notes_transposed = 0
-    for pitch_elem in root.findall(f".//{ns_prefix}pitch", ns):
-        step = pitch_elem.find(f"{ns_prefix}step", ns)
-        alter = pitch_elem.find(f"{ns_prefix}alter", ns)
-        octave = pitch_elem.find(f"{ns_prefix}octave", ns)
+    Args:
+        music_file: MusicXMLFile dataclass with source file info
+        target_keys: Target key signatures in fifths notation (-7 to +7)
+        keep_source: As for transpose_musicxml
 
-        if step is not None and octave is not None:
-            # Get current pitch info
-            current_step = step.text
-            current_alter = int(alter.text) if alter is not None and alter.text else 0
-            current_octave = int(octave.text)
-
-            # Convert to chromatic and transpose
-            chromatic_value = note_to_chromatic(current_step, current_alter)
-            new_chromatic = (chromatic_value + semitone_shift) % 12
-
-            # Check if we crossed octave boundary
-            octave_shift = (chromatic_value + semitone_shift) // 12
-            new_octave = current_octave + octave_shift
-
-            # Convert back to note notation
-            new_step, new_alter = chromatic_to_note(new_chromatic, prefer_sharps)
-
-            # Update XML
-            step.text = new_step
-            octave.text = str(new_octave)
-
-            if new_alter == 0:
-                # Remove alter element if natural
-                if alter is not None:
-                    pitch_elem.remove(alter)
-            else:
-                # Add or update alter element
-                if alter is None:
-                    alter = ET.SubElement(pitch_elem, f"{ns_prefix}alter")
-                    # Insert after step
-                    pitch_elem.remove(alter)
-                    pitch_elem.insert(1, alter)
-                alter.text = str(new_alter)
-
-            notes_transposed += 1
+    Returns:
+        Paths to the transposed output files, in the order of target_keys
+    """
+    if music_file.key_signature is None:
+        raise ValueError("Source file must have a key signature to transpose")
 
-    # Determine output path
-    if output_path is None:
-        original_path = Path(music_file.file_path)
-        output_path = str(original_path.with_name(
-            original_path.stem + f"_transposed_to_{KEY_SIGNATURES[target_key][0]}.xml"
-        ))
+    for target_key in target_keys:
+        if target_key not in KEY_SIGNATURES:
+            raise ValueError(f"Target key must be between -7 and +7, got {target_key}")
 
-    # Write transposed file
-    tree.write(output_path, encoding="UTF-8", xml_declaration=True)
+    score = None
+    output_paths = []
+    for target_key in target_keys:
+        if target_key == music_file.key_signature:
+            output_paths.append(_copy_source(music_file, target_key))
+            continue
 
-    print(f"✅ Transposed {notes_transposed} notes")
-    print(f"✅ Output written to: {output_path}")
+        # Load the source on the first key that needs rewriting
+        if score is None:
+            score = _get_source_score(music_file, keep_source)
+        output_paths.append(_write_transposed(score, music_file, target_key))
 
-    return output_path
+    return output_paths
 
 
 def main():
     """Example usage of the transposition tool."""
     # Example: transpose the parsed file
-    from cli import parse_musicxml
-
     # Parse the original file
     xml_file = parse_musicxml("/Users/harikoornala/Code/Random Projects with Chat/omr app apptmet 2/sheet1_unzipped/sheet1.xml")
 